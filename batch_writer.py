@@ -0,0 +1,117 @@
+import atexit
+import os
+import threading
+from typing import List, Optional, Tuple
+
+try:
+    import liburing
+except ImportError:  # liburing is Linux only, so fall back to ordinary writes everywhere else
+    liburing = None
+
+# the io_uring ring is set up the first time it is needed and then reused by every call, like the shared Inkscape
+# shell and worker pool. It has room for this many writes, so bigger batches are submitted in several rounds
+_RING_ENTRIES = 8
+_RING: Optional["liburing.Ring"] = None
+_CQE: Optional["liburing.Cqe"] = None
+# the plaque generator writes its SVGs from a background thread, so only one batch may use the ring at a time
+_RING_LOCK = threading.Lock()
+
+
+def _get_ring() -> Tuple["liburing.Ring", "liburing.Cqe"]:
+    """
+    Returns the shared ring (and the completion entry used to read its results), setting it up the first time.
+    It is torn down when the program exits. Must be called with _RING_LOCK held.
+    """
+    global _RING, _CQE
+    if _RING is None:
+        ring = liburing.Ring()
+        liburing.io_uring_queue_init(_RING_ENTRIES, ring, 0)
+        _RING, _CQE = ring, liburing.Cqe()
+        atexit.register(_close_ring)
+    return _RING, _CQE
+
+
+def _close_ring() -> None:
+    """
+    Tears down the shared ring. This is called automatically when the program exits.
+    """
+    global _RING, _CQE
+    with _RING_LOCK:
+        if _RING is not None:
+            liburing.io_uring_queue_exit(_RING)
+            _RING = None
+            _CQE = None
+            atexit.unregister(_close_ring)
+
+
+def batch_write_svgs(paths_and_contents: List[Tuple[str, str]]) -> None:
+    """
+    Writes several SVG documents at once. On Linux with liburing installed, the writes are submitted to the kernel
+    together in io_uring batches; otherwise the files are written one after another.
+
+    Parameters:
+        paths_and_contents: (file_path, svg_content) pairs. Existing files are overwritten.
+    """
+    # encode each document once up front and write the bytes as-is, skipping the text layer's newline
+    # translation and incremental encoding
+    buffers = [svg_content.encode('utf-8') for _, svg_content in paths_and_contents]
+
+    if liburing is None or not paths_and_contents:
+        for (file_path, _), buffer in zip(paths_and_contents, buffers):
+            with open(file_path, 'wb') as svg_file:
+                svg_file.write(buffer)
+        return
+
+    file_paths = [file_path for file_path, _ in paths_and_contents]
+    with _RING_LOCK:
+        ring, cqe = _get_ring()
+        for start in range(0, len(file_paths), _RING_ENTRIES):
+            _write_round(ring, cqe, file_paths[start:start + _RING_ENTRIES], buffers[start:start + _RING_ENTRIES])
+
+
+def _write_round(ring: "liburing.Ring", cqe: "liburing.Cqe", file_paths: List[str], buffers: List[bytes]) -> None:
+    """
+    Writes up to _RING_ENTRIES files with a single submission to the shared ring.
+    """
+    fds = []
+    try:
+        # open every file before preparing any writes, so that a failed open can't leave prepared but
+        # unsubmitted entries behind in the shared ring
+        for file_path in file_paths:
+            fds.append(os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666))
+
+        # buffers keeps the encoded documents alive until the kernel has finished with them
+        for index, (fd, buffer) in enumerate(zip(fds, buffers)):
+            sqe = liburing.io_uring_get_sqe(ring)
+            liburing.io_uring_prep_write(sqe, fd, buffer, 0)
+            liburing.io_uring_sqe_set_data64(sqe, index)
+        liburing.io_uring_submit(ring)
+
+        # the writes can complete in any order. Every completion is collected, even after an error, so none are
+        # left in the shared ring to be mistaken for the next batch's
+        error = None
+        short_writes = []
+        for _ in range(len(fds)):
+            liburing.io_uring_wait_cqe(ring, cqe)
+            entry = cqe[0]
+            index = liburing.io_uring_cqe_get_data64(entry)
+            try:
+                written = entry.res
+            except OSError as res_error:  # liburing raises for a failed write rather than returning -errno
+                written = -res_error.errno
+            liburing.io_uring_cqe_seen(ring, entry)
+            if written < 0:
+                if error is None:
+                    error = OSError(-written, os.strerror(-written), file_paths[index])
+            elif written < len(buffers[index]):
+                short_writes.append((index, written))
+        if error is not None:
+            raise error
+
+        # a short write is unlikely for a regular file, but finish it off rather than leave a truncated SVG
+        for index, written in short_writes:
+            while written < len(buffers[index]):
+                written += os.pwrite(fds[index], buffers[index][written:], written)
+    finally:
+        for fd in fds:
+            os.close(fd)
@@ -1,16 +1,37 @@
 import os
-import argparse
-import svg
-from typing import Optional, Tuple
-import cairosvg
-import svgwrite
-import svgwrite.text
-import subprocess
+import html
+from typing import Dict, Optional, Tuple
+from batch_writer import batch_write_svgs
+from inkscape_shell import export_pdfs, get_inkscape_shell
+
+
+# the documents always have the same structure, so they are written out directly as text rather than being built
+# up from svg.py objects. Coordinates and sizes are filled in already formatted with their "mm" unit
+_SVG_PRELUDE_TMPL = ('<svg xmlns="http://www.w3.org/2000/svg" width="{w}" height="{h}">'
+                     '<rect stroke="red" x="0" y="0" width="{w}" height="{h}" fill="white"/>')
+_TEXT_TMPL = ('<text stroke="none" dominant-baseline="{db}" text-anchor="{ta}" font-family="{ff}" font-size="{fs}" '
+              'fill="blue" x="{x}" y="{y}">{tspans}</text>')
+_TSPAN_TMPL = '<tspan x="{x}" dy="{dy}">{text}</tspan>'
+_SVG_END = '</svg>'
+
+# whole single-corner documents, assembled from the pieces above. Only the position, alignment, and order of the
+# lines differ between the 4 corners, so each corner is one format call
+_CORNER_TMPL_ONE_LINE = (_SVG_PRELUDE_TMPL +
+                         _TEXT_TMPL.replace('{tspans}', _TSPAN_TMPL.format(x='{x}', dy=1.2, text='{first}')) +
+                         _SVG_END)
+_CORNER_TMPL_TWO_LINES = (_SVG_PRELUDE_TMPL +
+                          _TEXT_TMPL.replace('{tspans}', _TSPAN_TMPL.format(x='{x}', dy=1.2, text='{first}') +
+                                             _TSPAN_TMPL.format(x='{x}', dy='{dy2}', text='{second}')) +
+                          _SVG_END)
+
+# suffixes for the documents of each corner, in the same order as the corners in writeSvg
+_CORNER_NAMES = ("_topLeft.svg", "_topRight.svg", "_bottomLeft.svg", "_bottomRight.svg")
+#_CORNER_NAMES = ("_topLeftCentral.svg", "_topLeftHanging.svg", "_bottomLeftCentral.svg", "_bottomLeftHanging.svg")
 
 
 def create_svg_corners(width: float, height: float, x: float, y: float, fontSize: int,
                        text_anchor: str, dominant_baseline: str, lower_corner: bool,
-                       label_line1: str, label_line2: Optional[str] = None) -> svg.SVG:
+                       label_line1: str, label_line2: Optional[str] = None) -> str:
     """
     Create a svg document with a label in the corner
 
@@ -33,49 +54,52 @@ def create_svg_corners(width: float, height: float, x: float, y: float, fontSize
         label_line2 (Optional[str]): Second line of the label (optional).
 
     Returns:
-        svg.SVG: The generated SVG.
+        str: The generated SVG.
+    """
+    return _render_corner(_document_values(width, height), x, y, fontSize, text_anchor, dominant_baseline,
+                          lower_corner, *_escape_lines(label_line1, label_line2))
+
+
+def _document_values(width: float, height: float) -> Dict[str, str]:
+    """
+    Returns the template values that are the same for all 4 corners of a document, already formatted.
     """
     garamond_with_serifs = 'Georgia'  # specifying Garamond font
+    return {"w": f"{width}mm", "h": f"{height}mm", "ff": garamond_with_serifs}
+
+
+def _escape_lines(label_line1: str, label_line2: Optional[str]) -> Tuple[str, Optional[str]]:
+    """
+    Returns the lines of the label escaped for SVG text. A missing or empty second line stays None.
+    """
+    return html.escape(label_line1), html.escape(label_line2) if label_line2 else None
+
 
+def _render_corner(document_values: Dict[str, str], x: float, y: float, fontSize: int, text_anchor: str,
+                   dominant_baseline: str, lower_corner: bool, line1: str, line2: Optional[str]) -> str:
+    """
+    Does the work of create_svg_corners, taking the parts that are the same in every corner already prepared by
+    _document_values and _escape_lines, so that writeSvg only has to prepare them once for all 4 corners.
+    """
+    values = dict(document_values, x=f"{x}mm", y=f"{y}mm", ta=text_anchor, db=dominant_baseline)
+    if not line2:
+        return _CORNER_TMPL_ONE_LINE.format(fs=fontSize, first=line1, **values)
+
+    fontSize = fontSize-2
     # if the label is being written in a lower corner of the document and the label has 2 lines of text,
     # we want to base the positioning of the label off the second line of text
-    if lower_corner and label_line2:
-        fontSize = fontSize-2
-        return svg.SVG(
-            width=svg.mm(width),
-            height=svg.mm(height),
-            elements=[
-                svg.Rect(x=0, y=0, width=svg.mm(width), height=svg.mm(height), fill="white", stroke="red"),
-                svg.Text(x=svg.mm(x), y=svg.mm(y), stroke= 'none', fill='blue', font_family=garamond_with_serifs, font_size=fontSize,
-                         text_anchor=text_anchor, dominant_baseline=dominant_baseline, elements=[
-                        svg.TSpan(x=svg.mm(x), dy=1.2, text=label_line2),
-                        svg.TSpan(x=svg.mm(x), dy=-1.2 * fontSize, text=label_line1)
-                    ]),
-            ]
-        )
-
-    else:
-        if label_line2:
-            fontSize = fontSize-2
-        return svg.SVG(
-            width=svg.mm(width),
-            height=svg.mm(height),
-            elements=[
-                svg.Rect(x=0, y=0, width=svg.mm(width), height=svg.mm(height), fill="white", stroke="red"),
-                svg.Text(x=svg.mm(x), y=svg.mm(y), stroke='none', fill='blue', font_family=garamond_with_serifs, font_size=fontSize,
-                         text_anchor=text_anchor, dominant_baseline=dominant_baseline, elements=[
-                        svg.TSpan(x=svg.mm(x), dy=1.2, text=label_line1),
-                        svg.TSpan(x=svg.mm(x), dy=1.2 * fontSize, text=label_line2) if label_line2 else None
-                    ]),
-            ]
-        )
+    if lower_corner:
+        return _CORNER_TMPL_TWO_LINES.format(fs=fontSize, first=line2, second=line1, dy2=-1.2 * fontSize, **values)
+    return _CORNER_TMPL_TWO_LINES.format(fs=fontSize, first=line1, second=line2, dy2=1.2 * fontSize, **values)
 
 
 def writeSvg(output_folder: str, file_name: str, width: float, height: float, x_percent_from_edge: float,
              y_percent_from_edge: float, fontSize: int, label_line1: str, label_line2: Optional[str] = None) -> None:
     r"""
-        Calls the create SVG function 4 times to generate 4 documents, each having the label in a different corner.
-        Saves these 4 SVG documents in the specified output folder and filename
+        Generates 4 documents the same way as create_svg_corners, each having the label in a different corner.
+        Saves these 4 SVG documents in the specified output folder and filename, and queues each of them to be
+        exported as a PDF by the shared Inkscape shell. The PDFs are made in the background, so they only exist once
+        inkscape_shell.close_inkscape_shell has returned (or the program has exited).
 
         Parameters:
             output_folder: The file path of the folder that the SVG should be saved in
@@ -92,41 +116,42 @@ def writeSvg(output_folder: str, file_name: str, width: float, height: float, x_
             label_line1 (str): First line of the label.
             label_line2 (Optional[str]): Second line of the label (optional).
         """
-    names = ["_topLeft.svg", "_topRight.svg", "_bottomLeft.svg", "_bottomRight.svg"]
-    #names = ["_topLeftCentral.svg", "_topLeftHanging.svg", "_bottomLeftCentral.svg", "_bottomLeftHanging.svg"]
-
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
+    os.makedirs(output_folder, exist_ok=True)
 
     #currently, both variables key off of width so that the label is the same distance away from the
         #horizontal and vertical edges. This can be changed if desired.
-    x_edge_distance = min(width, height) * x_percent_from_edge
-    y_edge_distance = min(width, height) * y_percent_from_edge
-
-    for i in range(4):
-        test_file_name = file_name + names[i]
-        svg_file_path = os.path.join(output_folder, test_file_name)
-        pdf_file_path = os.path.splitext(svg_file_path)[0] + ".pdf"
+    short_side = min(width, height)
+    x_edge_distance = short_side * x_percent_from_edge
+    y_edge_distance = short_side * y_percent_from_edge
+
+    # (svg_file_path, pdf_file_path) for each corner
+    file_paths = [(os.path.join(output_folder, file_name + name),
+                   os.path.join(output_folder, file_name + name[:-4] + ".pdf"))
+                  for name in _CORNER_NAMES]
+
+    left, right = x_edge_distance, width - x_edge_distance
+    top, bottom = y_edge_distance, height - y_edge_distance
+    # (x, y, text_anchor, dominant_baseline, lower_corner) for each corner, in the same order as _CORNER_NAMES
+    corners = [(left, top, "start", "hanging", False),
+               (right, top, "end", "hanging", False),
+               (left, bottom, "start", "central", True),
+               (right, bottom, "end", "central", True)]
+    # the size of the document and the lines of the label are the same in every corner, so they are formatted and
+    # escaped once here rather than once per corner
+    document_values = _document_values(width, height)
+    lines = _escape_lines(label_line1, label_line2)
+    svg_contents = [_render_corner(document_values, x, y, fontSize, text_anchor, dominant_baseline, lower_corner,
+                                   *lines)
+                    for x, y, text_anchor, dominant_baseline, lower_corner in corners]
+
+    # write all 4 documents in one batch before handing them to Inkscape
+    batch_write_svgs([(svg_file_path, svg_content)
+                      for (svg_file_path, _), svg_content in zip(file_paths, svg_contents)])
+
+    # Inkscape converts each SVG straight to a PDF with its text as paths. All 4 conversions go to the one
+    # shared Inkscape session rather than starting Inkscape once per corner
+    export_pdfs(file_paths)
 
-        if i == 0:  # top-left
-            svg_content = create_svg_corners(width, height, x_edge_distance, y_edge_distance, fontSize,
-                                             "start", "hanging", False, label_line1, label_line2)
-        elif i == 1:  # top-right
-            svg_content = create_svg_corners(width, height, width - x_edge_distance, y_edge_distance, fontSize,
-                                              "end", "hanging", False, label_line1, label_line2)
-        elif i == 2:  # bottom-left
-            svg_content = create_svg_corners(width, height, x_edge_distance, height - y_edge_distance, fontSize,
-                                             "start", "central", True, label_line1, label_line2)
-        else:  # bottom-right
-            svg_content = create_svg_corners(width, height, width - x_edge_distance, height - y_edge_distance,
-                                              fontSize, "end", "central", True, label_line1, label_line2)
-
-        with open(svg_file_path, 'w') as svg_file:
-            svg_file.write(str(svg_content))
-        
-        cairosvg.svg2pdf(url=svg_file_path, write_to=pdf_file_path)   
-        subprocess.run(["inkscape", pdf_file_path, "--export-pdf=" + pdf_file_path, "--export-text-to-path"]) 
-        
 
 # input_mapping = {
 #     "0: 6x8_portrait": (139.7, 203.2, 0.12, 0.12, 28),
@@ -168,13 +193,11 @@ def get_values_from_input() -> Tuple[float, float, float, float, int]:
     else:
         raise ValueError("Invalid input. Please choose a number between 0 and 6.")
 
-# Example usage:
-values = get_values_from_input()
-print(values)
-
 def get_labels_from_input() -> Tuple[str, Optional[str]]:
-    # Prompt the user to enter label 1
-    label1 = input("Enter label 1: ")
+    # Prompt the user to enter label 1, or nothing once they are done
+    label1 = input("Enter label 1 or press Enter to finish: ")
+    if not label1:
+        return label1, None
 
     # Prompt the user to enter label 2 or '0' to skip
     label2_input = input("Enter label 2 or '0' to skip: ")
@@ -182,933 +205,31 @@ def get_labels_from_input() -> Tuple[str, Optional[str]]:
 
     return label1, label2
 
-# Example usage:
-label1, label2 = get_labels_from_input()
-print("Label 1:", label1)
-print("Label 2:", label2)
 
-if label2:
-    output_folder = os.path.join(r"C:\Users\maxim\Documents\Treeline\PNG\inkscape", label1+label2)
-    writeSvg(
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        output_folder, label1+label2, *values, label1, label2)
-else:
-    output_folder = os.path.join(r"C:\Users\maxim\Documents\Treeline\PNG\inkscape", label1)
-    writeSvg(output_folder, label1, *values, label1)            
+# only prompt and generate files when run as a script, not when this module is imported
+if __name__ == "__main__":
+    # Example usage:
+    values = get_values_from_input()
+    print(values)
+
+    # start Inkscape now so that its slow startup (loading fonts and so on) happens while the labels are typed in
+    get_inkscape_shell()
+
+    # keep asking for labels so that a whole batch of artboards is made in one run. They all share the same
+    # Inkscape session, which is closed (after finishing its exports) when the program exits
+    while True:
+        label1, label2 = get_labels_from_input()
+        if not label1:
+            break
+        print("Label 1:", label1)
+        print("Label 2:", label2)
+
+        if label2:
+            output_folder = os.path.join(r"C:\Users\maxim\Documents\Treeline\PNG\inkscape", label1+label2)
+            writeSvg(output_folder, label1+label2, *values, label1, label2)
+        else:
+            output_folder = os.path.join(r"C:\Users\maxim\Documents\Treeline\PNG\inkscape", label1)
+            writeSvg(output_folder, label1, *values, label1)
 
 
 # test_output_folder = os.path.join(r"C:\Users\maxim\Documents\Treeline\PNG\inkscape", label1+label2)
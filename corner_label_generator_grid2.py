@@ -1,13 +1,26 @@
 import os
-import svg
+import html
 from typing import Optional
-import cairosvg
-import subprocess
+from batch_writer import batch_write_svgs
+from inkscape_shell import export_pdfs, get_inkscape_shell
+
+
+# the documents always have the same structure, so they are written out directly as text rather than being built
+# up from svg.py objects. Coordinates and sizes are filled in already formatted with their "mm" unit
+_SVG_PRELUDE_TMPL = ('<svg xmlns="http://www.w3.org/2000/svg" width="{w}" height="{h}">'
+                     '<rect stroke="red" x="0" y="0" width="{w}" height="{h}" fill="white"/>')
+_TEXT_TMPL = ('<text stroke="none" dominant-baseline="{db}" text-anchor="{ta}" font-family="{ff}" font-size="{fs}" '
+              'fill="{fill}" x="{x}" y="{y}">{tspans}</text>')
+_TSPAN_TMPL = '<tspan x="{x}" dy="{dy}">{text}</tspan>'
+_SVG_END = '</svg>'
+
+# suffixes for the documents of each corner
+_CORNER_NAMES = ("_topLeftGrid.svg", "_topRightGrid.svg", "_bottomLeftGrid.svg", "_bottomRightGrid.svg")
 
 
 def create_svg_corners_grid(rows: int, columns: int, width: float, height: float, x: float, y: float, fontSize: int,
                        text_anchor: str, dominant_baseline: str, lower_corner: bool,
-                       label_line1: str, label_line2: Optional[str] = None) -> svg.SVG:
+                       label_line1: str, label_line2: Optional[str] = None) -> str:
     """
     Create a SVG document with a label grid.
 
@@ -24,47 +37,49 @@ def create_svg_corners_grid(rows: int, columns: int, width: float, height: float
         label_line2 (Optional[str]): Second line of the label (optional).
 
     Returns:
-        svg.SVG: The generated SVG.
+        str: The generated SVG.
     """
     colorArray = ['#0000FF','#0096FF','#00FFFF']
     garamond_with_serifs = 'Georgia'  # specifying Garamond font
     board_width = width * columns
     board_height = height * rows
 
-    elements = []
-    elements.append(svg.Rect(x=0, y=0, width=svg.mm(board_width), height=svg.mm(board_height), fill="white", stroke="red"))
+    label_line1 = html.escape(label_line1)
+    if label_line2:
+        label_line2 = html.escape(label_line2)
+
+    # everything that only depends on the column or the row is worked out once up front, so the loop below
+    # only has to fill in the text element for each cell
+    mm_w, mm_h = float(width), float(height)
+    # X-coordinate of the label in each column and Y-coordinate of the label in each row
+    col_offsets = [f"{x + mm_w * column}mm" for column in range(columns)]
+    row_offsets = [f"{y + mm_h * row}mm" for row in range(rows)]
+
+    # the lines of text only depend on the X-coordinate of the label
+    if lower_corner and label_line2:
+        column_tspans = [_TSPAN_TMPL.format(x=label_x, dy=1.2, text=label_line2) +
+                         _TSPAN_TMPL.format(x=label_x, dy=-1.2 * fontSize, text=label_line1)
+                         for label_x in col_offsets]
+    elif label_line2:
+        column_tspans = [_TSPAN_TMPL.format(x=label_x, dy=1.2, text=label_line1) +
+                         _TSPAN_TMPL.format(x=label_x, dy=1.2 * fontSize, text=label_line2)
+                         for label_x in col_offsets]
+    else:
+        column_tspans = [_TSPAN_TMPL.format(x=label_x, dy=1.2, text=label_line1) for label_x in col_offsets]
+
+    # fill in the attributes that are the same for every cell once, leaving the per-cell ones as placeholders
+    text_tmpl = _TEXT_TMPL.format(x='{x}', y='{y}', fill='{fill}', ff=garamond_with_serifs, fs=fontSize,
+                                  ta=text_anchor, db=dominant_baseline, tspans='{tspans}')
+    # the whole document is assembled with a single join, so the text of every cell is only copied once
+    elements = [_SVG_PRELUDE_TMPL.format(w=f"{board_width}mm", h=f"{board_height}mm")]
+    elements.extend(text_tmpl.format(x=col_offsets[column], y=row_offsets[row],
+                                     fill=colorArray[(column * rows + row) % len(colorArray)],
+                                     tspans=column_tspans[column])
+                    for column in range(columns) for row in range(rows))
+    elements.append(_SVG_END)
+
+    return "".join(elements)
 
-    colorIndex = 0
-    for column in range(columns):
-        for row in range(rows):
-            label_x = x + float(width) * float(column)  # Calculate X-coordinate of the label
-            label_y = y + float(height) * float(row)    # Calculate Y-coordinate of the label
-            print("label x:", label_x)
-            print("label y: ", label_y,"\n")
-            
-
-            if lower_corner and label_line2:
-            
-                text_element=svg.Text(x=svg.mm(label_x), y=svg.mm(label_y), stroke= 'none', fill=colorArray[colorIndex], font_family=garamond_with_serifs, font_size=fontSize,
-                            text_anchor=text_anchor, dominant_baseline=dominant_baseline, elements=[
-                            svg.TSpan(x=svg.mm(label_x), dy=1.2, text=label_line2),
-                            svg.TSpan(x=svg.mm(label_x), dy=-1.2 * fontSize, text=label_line1)
-                        ])
-            else:
-                  text_element = svg.Text(x=svg.mm(label_x), y=svg.mm(label_y), stroke='none', fill=colorArray[colorIndex], font_family=garamond_with_serifs, font_size=fontSize,
-                         text_anchor=text_anchor, dominant_baseline=dominant_baseline, elements=[
-                        svg.TSpan(x=svg.mm(label_x), dy=1.2, text=label_line1),
-                        svg.TSpan(x=svg.mm(label_x), dy=1.2 * fontSize, text=label_line2) if label_line2 else None
-                    ])  
-            colorIndex+=1      
-            elements.append(text_element)
-
-
-    return svg.SVG(
-        width=svg.mm(board_width),
-        height=svg.mm(board_height),
-        elements=elements
-    )
 
 # TODO: Change parameter order
 
@@ -75,7 +90,9 @@ def writeSvg(output_folder: str, file_name: str, rows: int, columns: int, width:
     
     """
     Calls the create_svg_corners_3x3 function to generate an SVG grid of labels.
-    Saves the SVG document in the specified output folder and filename.
+    Saves the SVG document in the specified output folder and filename, and queues it to be exported as a PDF by
+    the shared Inkscape shell. The PDFs are made in the background, so they only exist once
+    inkscape_shell.close_inkscape_shell has returned (or the program has exited).
 
     Parameters:
         output_folder (str): The file path of the folder where the SVG should be saved.
@@ -88,52 +105,51 @@ def writeSvg(output_folder: str, file_name: str, rows: int, columns: int, width:
         label_line1 (str): First line of the label.
         label_line2 (Optional[str]): Second line of the label (optional).
     """
-    names = ["_topLeftGrid.svg", "_topRightGrid.svg", "_bottomLeftGrid.svg", "_bottomRightGrid.svg"]
-
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-
-    x_start = min(width, height) * x_percent_from_edge
-    y_start = min(width, height) * y_percent_from_edge
-
-    for i in range(4):
-        test_file_name = file_name + names[i]
-        svg_file_path = os.path.join(output_folder, test_file_name)
-        pdf_file_path = os.path.splitext(svg_file_path)[0] + ".pdf"
-
-
-        if i == 0:  # top-left
-            svg_content = create_svg_corners_grid(rows, columns, width, height, x_start, y_start, fontSize,
-                                             "start", "text-top", False, label_line1, label_line2)
-        elif i == 1:  # top-right
-            svg_content = create_svg_corners_grid(rows, columns, width, height, width - x_start, y_start, fontSize,
-                                             "end", "text-top", False, label_line1, label_line2)
-        elif i == 2:  # bottom-left
-            svg_content = create_svg_corners_grid(rows, columns, width, height, x_start, height - y_start, fontSize,
-                                             "start", "text-bottom", True, label_line1, label_line2)
-        else:  # bottom-right
-            svg_content = create_svg_corners_grid(rows, columns, width, height, width - x_start, height - y_start,
-                                             fontSize, "end", "text-bottom", True, label_line1, label_line2)
-
-        with open(svg_file_path, 'w') as svg_file:
-            svg_file.write(str(svg_content))
-
-        subprocess.run(["inkscape", svg_file_path, "--export-pdf=" + pdf_file_path, "--export-text-to-path"]) 
-
-
-    
-    
-
-
-rows = 1
-columns = 1
-width = 139.7
-height = 203.2
-label1 = "Alabama"
-text_size = 28
-
-output_folder = os.path.join(r"C:\Users\maxim\Documents\Treeline\grid", label1)
-writeSvg(output_folder, label1, rows, columns, width, height, text_size, label1)
+    os.makedirs(output_folder, exist_ok=True)
+
+    short_side = min(width, height)
+    x_start = short_side * x_percent_from_edge
+    y_start = short_side * y_percent_from_edge
+
+    # (svg_file_path, pdf_file_path) for each corner
+    file_paths = [(os.path.join(output_folder, file_name + name),
+                   os.path.join(output_folder, file_name + name[:-4] + ".pdf"))
+                  for name in _CORNER_NAMES]
+
+    # make sure Inkscape is already starting up (loading fonts and so on) while the documents are rendered
+    get_inkscape_shell()
+
+    left, right = x_start, width - x_start
+    top, bottom = y_start, height - y_start
+    # (x, y, text_anchor, dominant_baseline, lower_corner) for each corner, in the same order as _CORNER_NAMES
+    corners = [(left, top, "start", "text-top", False),
+               (right, top, "end", "text-top", False),
+               (left, bottom, "start", "text-bottom", True),
+               (right, bottom, "end", "text-bottom", True)]
+    # rendering a corner only formats a few strings, which is quicker than handing it off to a worker process
+    svg_contents = [create_svg_corners_grid(rows, columns, width, height, x, y, fontSize, text_anchor,
+                                            dominant_baseline, lower_corner, label_line1, label_line2)
+                    for x, y, text_anchor, dominant_baseline, lower_corner in corners]
+
+    # write all 4 documents in one batch before handing them to Inkscape
+    batch_write_svgs([(svg_file_path, svg_content)
+                      for (svg_file_path, _), svg_content in zip(file_paths, svg_contents)])
+
+    # all 4 conversions go to the one shared Inkscape session rather than starting Inkscape once per corner
+    export_pdfs(file_paths)
+
+
+# only generate the example when run as a script, not when this module is imported
+if __name__ == "__main__":
+    rows = 1
+    columns = 1
+    width = 139.7
+    height = 203.2
+    label1 = "Alabama"
+    text_size = 28
+
+    output_folder = os.path.join(r"C:\Users\maxim\Documents\Treeline\grid", label1)
+    writeSvg(output_folder, label1, rows, columns, width, height, text_size, label1)
 
 """for column in range(columns):
         for row in range(rows):
@@ -0,0 +1,141 @@
+import atexit
+import queue
+import subprocess
+import threading
+from typing import Iterable, List, Optional, Tuple, Union
+
+# one Inkscape process is shared by every export in a run. Starting Inkscape (fonts, GTK, extensions) takes far
+# longer than the conversion itself, so the commands are fed to a single `inkscape --shell` session instead
+_INKSCAPE_SHELL: Optional[subprocess.Popen] = None
+
+# commands are handed to the shell by a background thread. Writing to Inkscape's stdin blocks whenever the pipe is
+# full (which only takes a few commands on Windows), and this way the caller can carry on generating the next
+# documents while Inkscape works through the queue. A list is a separate Inkscape command line to run instead (see
+# export_pdfs), and None tells the thread to stop
+_EXPORT_QUEUE: "queue.Queue[Union[str, List[str], None]]" = queue.Queue()
+_FEEDER: Optional[threading.Thread] = None
+# the first error the background thread ran into (for example Inkscape having crashed), so that it can be raised to
+# the caller instead of being lost with the thread
+_FEEDER_ERROR: Optional[BaseException] = None
+
+
+# characters that would end an action (or the whole line of actions) early if they were part of a file path
+_SHELL_SEPARATORS = (";", "\n", "\r")
+
+
+def _feed_inkscape_shell(shell: subprocess.Popen, commands: "queue.Queue[Union[str, List[str], None]]") -> None:
+    """
+    Passes queued commands on to the Inkscape shell until it is told to stop, or until the shell has gone away.
+    """
+    global _FEEDER_ERROR
+    while True:
+        command = commands.get()
+        if command is None:
+            break
+        try:
+            if isinstance(command, list):
+                subprocess.run(command, check=True)
+            else:
+                shell.stdin.write(command.encode("utf-8"))
+                shell.stdin.flush()
+        except Exception as error:  # anything uncaught would end the thread and silently drop every later export
+            if _FEEDER_ERROR is None:
+                _FEEDER_ERROR = error
+            # a single command failing only loses that one file, but if the shell has exited nothing else can be sent
+            if isinstance(error, OSError) and not isinstance(command, list):
+                break
+
+
+def _raise_feeder_error(error: Optional[BaseException]) -> None:
+    """
+    Raises the error the background thread ran into, if there was one.
+    """
+    if error is not None:
+        raise RuntimeError("Inkscape failed to export a PDF, so some of the PDFs have not been made") from error
+
+
+def _check_feeder() -> None:
+    """
+    Raises if the background thread has run into an error, or has stopped without being told to.
+    """
+    _raise_feeder_error(_FEEDER_ERROR)
+    if _FEEDER is not None and not _FEEDER.is_alive():
+        raise RuntimeError("The thread passing exports to Inkscape has stopped, so some of the PDFs have not "
+                           "been made")
+
+
+def get_inkscape_shell() -> subprocess.Popen:
+    """
+    Returns the shared Inkscape shell, starting it the first time it is needed.
+
+    Returns:
+        subprocess.Popen: The running `inkscape --shell` process.
+    """
+    global _INKSCAPE_SHELL, _EXPORT_QUEUE, _FEEDER
+    if _INKSCAPE_SHELL is None:
+        # the shell prints a prompt after every command. Nothing reads it, so send it to DEVNULL rather than a pipe
+        # that could fill up and stall Inkscape. Commands are written as UTF-8 bytes rather than through a text pipe,
+        # which would use the locale's code page (cp1252 on Windows) for file names made from the labels, and
+        # would turn each newline into \r\n
+        _INKSCAPE_SHELL = subprocess.Popen(["inkscape", "--shell"], stdin=subprocess.PIPE,
+                                           stdout=subprocess.DEVNULL)
+        _EXPORT_QUEUE = queue.Queue()
+        _FEEDER = threading.Thread(target=_feed_inkscape_shell, args=(_INKSCAPE_SHELL, _EXPORT_QUEUE), daemon=True)
+        _FEEDER.start()
+        # make sure everything queued has been exported before the program exits
+        atexit.register(close_inkscape_shell)
+    return _INKSCAPE_SHELL
+
+
+def export_pdfs(conversions: Iterable[Tuple[str, str]]) -> None:
+    """
+    Queues documents to be exported as PDFs with their text converted to paths. Returns straight away, so the
+    PDFs only exist once close_inkscape_shell has returned (or the program has exited).
+
+    Parameters:
+        conversions: (input_file_path, pdf_file_path) pairs. The input can be any file Inkscape can open,
+            and may be the same file as the output.
+    """
+    get_inkscape_shell()
+    # don't keep queueing exports that will never be made
+    _check_feeder()
+    for input_file_path, pdf_file_path in conversions:
+        # the shell has no way to quote a path, so one containing a separator would split the line and the export
+        # would silently go wrong. Those few files get a separate Inkscape run instead, with the paths as arguments
+        if any(separator in file_path for file_path in (input_file_path, pdf_file_path)
+               for separator in _SHELL_SEPARATORS):
+            _EXPORT_QUEUE.put(["inkscape", input_file_path, f"--export-filename={pdf_file_path}",
+                               "--export-type=pdf", "--export-text-to-path"])
+            continue
+        # the export type is given explicitly so Inkscape doesn't have to work it out from the file extension
+        _EXPORT_QUEUE.put(f"file-open:{input_file_path}; export-filename:{pdf_file_path}; export-type:pdf; "
+                          f"export-text-to-path; export-do; file-close\n")
+
+
+def close_inkscape_shell() -> None:
+    """
+    Closes the shared Inkscape shell and waits for it to finish any exports that are still queued.
+    This is called automatically when the program exits.
+
+    Raises:
+        RuntimeError: If any of the exports couldn't be made, for example because Inkscape crashed.
+    """
+    global _INKSCAPE_SHELL, _FEEDER, _FEEDER_ERROR
+    if _INKSCAPE_SHELL is not None:
+        # the thread only stops by itself when something has gone wrong
+        feeder_stopped = not _FEEDER.is_alive()
+        _EXPORT_QUEUE.put(None)
+        _FEEDER.join()
+        try:
+            _INKSCAPE_SHELL.stdin.close()
+        except OSError:  # the shell has already exited, which the feeder has recorded
+            pass
+        _INKSCAPE_SHELL.wait()
+        _INKSCAPE_SHELL = None
+        _FEEDER = None
+        atexit.unregister(close_inkscape_shell)
+        error, _FEEDER_ERROR = _FEEDER_ERROR, None
+        _raise_feeder_error(error)
+        if feeder_stopped:
+            raise RuntimeError("The thread passing exports to Inkscape stopped early, so some of the PDFs have not "
+                               "been made")
@@ -1,13 +1,62 @@
-import svg
 import os
-from typing import Optional
-import argparse
+import html
+import pathlib
+import hashlib
+import shutil
+import functools
+from typing import List, Optional, Tuple
 import cairosvg
+from concurrent.futures import ThreadPoolExecutor
+from batch_writer import batch_write_svgs
+from worker_pool import get_pool, pool_size
+
+try:
+    import resvg_py
+except ImportError:  # resvg is optional, CairoSVG is used when it isn't installed
+    resvg_py = None
+
+# size of the artboard relative to the plaque, leaving a small margin around the plaque's outline
+ARTBOARD_SCALE = 1.05
+
+# estimated width of one character of the label, as a fraction of the font size.
+# Adjust as needed, 0.55 has worked well in my testing.
+WIDTH_PER_CHAR = 0.55
+# padding around the text on each side, as a fraction of the font size
+PAD_FRAC = 0.1
+
+# rendered PNGs are kept here and copied again whenever the same plaque comes up, instead of being re-rendered.
+# Pass cache_dir=None to write_svg_plaque(s) to turn this off
+PNG_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "_cache")
+# once the cache holds more PNGs than this, the ones that haven't been used for the longest are deleted
+PNG_CACHE_MAX_FILES = 1000
+
+# lowercase letters that hang below the baseline
+DESCENDERS = frozenset("gjpqy")
+
+# every plaque has the same structure (the outline, a quarter-circle arc in each corner and the label), so the
+# documents are written out directly as text rather than being built up from svg.py objects. The "_in" coordinates
+# are the ends of the arcs, one corner radius in from the edge of the plaque
+_PLAQUE_PRELUDE_TMPL = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="{artboard_width}" height="{artboard_height}" '
+    'viewBox="0 0 {artboard_width} {artboard_height}">'
+    '<rect stroke="red" x="{left}" y="{top}" width="{plaque_width}" height="{plaque_height}" fill="none"/>'
+    '<path stroke="red" d="M {left} {top_in} A {r} {r} 0 0 0 {left_in} {top}" fill="none"/>'
+    '<path stroke="red" d="M {right_in} {top} A {r} {r} 0 0 0 {right} {top_in}" fill="none"/>'
+    '<path stroke="red" d="M {left_in} {bottom} A {r} {r} 0 0 0 {left} {bottom_in}" fill="none"/>'
+    '<path stroke="red" d="M {right} {bottom_in} A {r} {r} 0 0 0 {right_in} {bottom}" fill="none"/>'
+    '<text dominant-baseline="middle" text-anchor="middle" font-family="Garamond, serif" font-size="{fontSize}" '
+    'fill="blue" x="{center_x}" y="{text_y}">'
+)
+_PLAQUE_TMPL_ONE_LINE = (_PLAQUE_PRELUDE_TMPL + '{line1}</text></svg>').format_map
+_PLAQUE_TMPL_TWO_LINES = (_PLAQUE_PRELUDE_TMPL + '<tspan x="{center_x}" dy="1.2">{line1}</tspan>'
+                          '<tspan x="{center_x}" dy="{fontSize}">{line2}</tspan></text></svg>').format_map
+
 
 # function to determine if a line of text has underhanging characters
+# the same labels come up again and again in a batch, so the answers are cached
+@functools.lru_cache(maxsize=1024)
 def has_descenders(label_line: str) -> bool:
-    descender_characters = {'g', 'j', 'p', 'q', 'y'}  # Set of characters with descenders
-    return any(char in descender_characters for char in label_line)
+    return not DESCENDERS.isdisjoint(label_line)
 
 def calculate_plaque_dimensions(fontSize: int, label_line1: str, label_line2: Optional[str] = None):
      # Determine the number of lines of text
@@ -15,26 +64,35 @@ def calculate_plaque_dimensions(fontSize: int, label_line1: str, label_line2: Op
 
     # Estimate text width based on label length and font size
     max_label_length = max(len(label_line1), len(label_line2 or ""))
-    text_width = max_label_length * (fontSize) * 0.55
-    # Adjust multiplier as needed, 0.55 has worked well in my testing.
+
+    return _plaque_dimensions(fontSize, max_label_length, num_lines)
+
+
+# the size of a plaque only depends on the font size, the length of the longest line and the number of lines, and
+# a catalog mostly uses the same few font sizes, so the same sizes come up again and again
+@functools.lru_cache(maxsize=4096)
+def _plaque_dimensions(fontSize: int, max_label_length: int, num_lines: int) -> Tuple[float, float]:
+    text_width = max_label_length * fontSize * WIDTH_PER_CHAR
 
     # Estimate text height based on font size and number of lines
     text_height = fontSize * num_lines
 
     # Add padding around the text
-    padding_x = fontSize * 0.1
-    padding_y = fontSize * 0.1
+    padding_x = fontSize * PAD_FRAC
+    padding_y = fontSize * PAD_FRAC
 
-    # calculate the width and height of the plaque. To change the width, modify the text_width multiplier
+    # calculate the width and height of the plaque. To change the width, modify WIDTH_PER_CHAR
     plaque_width = text_width + 2 * padding_x
     plaque_height = text_height + 2 * padding_y
 
     return plaque_width, plaque_height
 
 
-def create_svg_plaque(fontSize: int, label_line1: str, label_line2: Optional[str] = None) -> svg.SVG:
+def create_svg_plaque(fontSize: int, label_line1: str,
+                      label_line2: Optional[str] = None) -> Tuple[str, float, float]:
     """
-        Create SVG corners.
+        Create the SVG document for a plaque: the plaque outline with a quarter-circle arc in each corner, and the
+        label centred on it. The plaque is sized to fit the label, on an artboard ARTBOARD_SCALE times its size.
 
         Parameters:
             fontSize (int): Font size.
@@ -42,57 +100,35 @@ def create_svg_plaque(fontSize: int, label_line1: str, label_line2: Optional[str
             label_line2 (Optional[str]): Second line of the label (optional).
 
         Returns:
-            svg.SVG: The generated SVG.
+            Tuple[str, float, float]: (svg, artboard_width, artboard_height)
+                svg: The generated SVG document.
+                artboard_width, artboard_height: The size of the document, in SVG user units (pixels). These are
+                    the sizes the PNG is rendered at.
         """
-    garamond_with_serifs = 'Garamond, serif'  # specifying Garamond font
-
-    # Calculate corner radius for the arcs
     plaque_width, plaque_height = calculate_plaque_dimensions(fontSize, label_line1, label_line2)
 
-    artboard_width = plaque_width * 1.05
-    artboard_height = plaque_height * 1.05
+    artboard_width = plaque_width * ARTBOARD_SCALE
+    artboard_height = plaque_height * ARTBOARD_SCALE
 
     # Calculate plaque position to center it on the artboard
     plaque_x = (artboard_width - plaque_width) / 2
     plaque_y = (artboard_height - plaque_height) / 2
 
-    
+    # Calculate corner radius for the arcs
     corner_radius = plaque_height * 0.20
 
-    # Define the paths for quarter-circle arcs in each corner
-    arc_top_left = svg.Path(
-        d=f"M {plaque_x} {plaque_y + corner_radius} A {corner_radius} {corner_radius} 0 0 0 {plaque_x + corner_radius} {plaque_y}",
-        fill="none",
-        stroke="red"
-    )
-    arc_top_right = svg.Path(
-        d=f"M {plaque_x + plaque_width - corner_radius} {plaque_y} A {corner_radius} {corner_radius} 0 0 0 {plaque_x + plaque_width} {plaque_y + corner_radius}",
-        fill="none",
-        stroke="red"
-    )
-    arc_bottom_left = svg.Path(
-        d=f"M {plaque_x + corner_radius} {plaque_y + plaque_height} A {corner_radius} {corner_radius} 0 0 0 {plaque_x} {plaque_y + plaque_height - corner_radius}",
-        fill="none",
-        stroke="red"
-    )
-    arc_bottom_right = svg.Path(
-        d=f"M {plaque_x + plaque_width} {plaque_y + plaque_height - corner_radius} A {corner_radius} {corner_radius} 0 0 0 {plaque_x + plaque_width - corner_radius} {plaque_y + plaque_height}",
-        fill="none",
-        stroke="red"
-    )
-
-
-    # create the plaque rectangle
-    #rectangle = svg.Rect(x=0, y=0, width=plaque_width, height=plaque_height, fill="none", stroke="red")
-    rectangle = svg.Rect(x=plaque_x, y=plaque_y, width=plaque_width, height=plaque_height, fill="none", stroke="red")
-    # the elements that will be included in the SVG drawing
-    elements = [
-        rectangle,
-        arc_top_left,
-        arc_top_right,
-        arc_bottom_left,
-        arc_bottom_right,
-    ]
+    plaque_right = plaque_x + plaque_width
+    plaque_bottom = plaque_y + plaque_height
+    # the label is centred horizontally on the plaque
+    center_x = plaque_x + (plaque_width / 2)
+    half_height = plaque_height / 2
+
+    values = {"artboard_width": artboard_width, "artboard_height": artboard_height,
+              "plaque_width": plaque_width, "plaque_height": plaque_height, "r": corner_radius,
+              "left": plaque_x, "top": plaque_y, "right": plaque_right, "bottom": plaque_bottom,
+              "left_in": plaque_x + corner_radius, "top_in": plaque_y + corner_radius,
+              "right_in": plaque_right - corner_radius, "bottom_in": plaque_bottom - corner_radius,
+              "fontSize": fontSize, "center_x": center_x, "line1": html.escape(label_line1)}
 
     # Add text elements as TSpan if label_line2 is provided-- meaning there are 2 lines of text in the plaque
     if label_line2:
@@ -100,37 +136,28 @@ def create_svg_plaque(fontSize: int, label_line1: str, label_line2: Optional[str
         # if line 2 does not have underhanging characters, an offset of 0.45 looks better. If not 0.5
         # These values are based on what looks visually good in testing, and can be changed as needed
         y_offset = 0.45 if not has_descenders(label_line2) else 0.5
-        
-        text_element = svg.Text(x=plaque_x + (plaque_width / 2), y=plaque_y + 0.85*((plaque_height / 2) - (y_offset * fontSize)),
-                                font_family=garamond_with_serifs, font_size=fontSize, text_anchor='middle',
-                                dominant_baseline="middle", fill='blue',
-                                elements=[svg.TSpan(x=plaque_x + (plaque_width / 2), dy=1.2, text=label_line1),
-                                    svg.TSpan(x=plaque_x + (plaque_width / 2), dy=1 * fontSize,
-                                              text=label_line2) if label_line2 else None
-                                ])
-        elements.append(text_element)
+
+        values["text_y"] = plaque_y + 0.85*(half_height - (y_offset * fontSize))
+        values["line2"] = html.escape(label_line2)
+        svg_content = _PLAQUE_TMPL_TWO_LINES(values)
 
     else:
         # if there are underhanging characters, the label should be positioned slightly higher on the plaque
         # 0.05 * fontSize seems to work well for underhanging labels, 0.1 * fontSize for no underhanging characters
         y_offset = 0.05 if has_descenders(label_line1) else 0.1
 
-        text_element = svg.Text(x=plaque_x + (plaque_width / 2), y=plaque_y + 0.85*((plaque_height / 2) + (y_offset * fontSize)),
-                                text_anchor="middle", dominant_baseline="middle", fill='blue',
-                                font_family=garamond_with_serifs, font_size=fontSize, text=label_line1)
-        elements.append(text_element)
+        values["text_y"] = plaque_y + 0.85*(half_height + (y_offset * fontSize))
+        svg_content = _PLAQUE_TMPL_ONE_LINE(values)
 
-    return svg.SVG(
-        width=artboard_width,
-        height=artboard_height,
-        elements=elements
-    )
+    return svg_content, artboard_width, artboard_height
 
 
 def write_svg_plaque(output_folder: str, file_name: str, fontSize: int, label_line1: str,
-                     label_line2: Optional[str] = None) -> None:
+                     label_line2: Optional[str] = None, backend: str = "resvg",
+                     cache_dir: Optional[str] = PNG_CACHE_DIR) -> None:
     r"""
            Calls the function to generate the plaque SVG and saves the svg in the desired file path.
+           To make several plaques at once, use write_svg_plaques instead.
 
            Parameters:
                output_folder: The file path of the folder that the SVG should be saved in
@@ -141,35 +168,165 @@ def write_svg_plaque(output_folder: str, file_name: str, fontSize: int, label_li
                fontSize: The size of the font
                label_line1 (str): First line of the label.
                label_line2 (Optional[str]): Second line of the label (optional).
+               backend: The library used to make the PNG, either "resvg" or "cairosvg". resvg is much faster, but
+                        CairoSVG is used instead if resvg_py isn't installed
+               cache_dir: Folder where rendered PNGs are cached, so a plaque that has been made before is copied
+                        rather than rendered again. None turns the cache off
            """
-    svg_file_path = os.path.join(output_folder, f"{file_name}_plaque.svg")
-    png_file_path = os.path.splitext(svg_file_path)[0] + ".png" 
-    with open(svg_file_path, 'w') as file:
-        file.write(str(create_svg_plaque(fontSize, label_line1, label_line2)))
+    write_svg_plaques(output_folder, [(file_name, fontSize, label_line1, label_line2)], backend, cache_dir)
 
-    plaque_width, plaque_height = calculate_plaque_dimensions(fontSize, label_line1, label_line2)
-    artboard_width = plaque_width * 1.05
-    artboard_height = plaque_height * 1.05
-    # svg_width_inches = plaque_width / 25.4
-    # svg_height_inches = plaque_height / 25.4
-    # output_width = int(svg_width_inches * 96)
-    # output_height = int(svg_height_inches * 96)
-    # print("output_width: ", output_width)
-    # print("Output_height: ", output_height, "\n")
-    # Convert SVG to PNG using CairoSVG
-    # cairosvg.svg2png(url=svg_file_path, write_to=png_file_path, dpi=96, output_width=(output_width * 2), output_height=(output_height*2))
-    cairosvg.svg2png(url=svg_file_path, write_to=png_file_path, dpi=96, output_width=artboard_width, output_height=artboard_height)      
-
-
-test_output_folder = r"C:\Users\maxim\Documents\Treeline\outputFiles\plaques\png_conversion"
-
-label1 = "Broken Mountain"
-label1_underhang = "Goopy Pijen Rqual"
-label2 = "Sisters, Kansas"
-
-write_svg_plaque(test_output_folder, "2_lines_noUnderhang", 80, label1, label2)
-write_svg_plaque(test_output_folder, "BrokenNoUnderhang", 80, label1)
-write_svg_plaque(test_output_folder, "underhang", 80, label1_underhang)
-write_svg_plaque(test_output_folder, "2_lines_underhang", 80, label1_underhang, label1_underhang)
-write_svg_plaque(test_output_folder, "0.8_offset", 24, label1, label1_underhang)
-write_svg_plaque(test_output_folder, "2_lines_underhang_topOnly", 80, label1_underhang, label1)
\ No newline at end of file
+
+def write_svg_plaques(output_folder: str, jobs: List[Tuple[str, int, str, Optional[str]]],
+                      backend: str = "resvg", cache_dir: Optional[str] = PNG_CACHE_DIR) -> None:
+    r"""
+           Generates a batch of plaques, saving an SVG and a PNG of each one in the desired folder. The plaques
+           are independent of each other, so when there is more than one they are shared out between worker
+           processes.
+
+           Parameters:
+               output_folder: The file path of the folder that the files should be saved in. See write_svg_plaque.
+               jobs: (file_name, fontSize, label_line1, label_line2) for each plaque, with the same meanings as the
+                   parameters of write_svg_plaque. label_line2 can be None.
+               backend: The library used to make the PNGs. See write_svg_plaque.
+               cache_dir: Folder where rendered PNGs are cached. See write_svg_plaque.
+           """
+    chunk_count = min(len(jobs), pool_size())
+    if chunk_count > 1:
+        # the rasterizers hold the GIL for much of their work, so this needs processes rather than threads. Each
+        # worker gets one batch of plaques rather than one plaque at a time, so that it writes all of its SVGs together
+        chunks = [jobs[i::chunk_count] for i in range(chunk_count)]
+        render = functools.partial(_write_plaques_in_process, output_folder, backend=backend, cache_dir=cache_dir)
+        # consume the results so that any exception raised in a worker is re-raised here
+        list(get_pool().map(render, chunks))
+    else:
+        _write_plaques_in_process(output_folder, jobs, backend, cache_dir)
+
+
+def _write_plaques_in_process(output_folder: str, jobs: List[Tuple[str, int, str, Optional[str]]],
+                              backend: str, cache_dir: Optional[str]) -> None:
+    """
+    Generates a batch of plaques one after another in this process. Kept at module level so that
+    write_svg_plaques can hand a batch off to a worker process. All of the SVGs are generated first and then
+    rasterized, passing each SVG to the rasterizer from memory rather than having it re-read the file that was just
+    written. The SVG files of the batch are saved together in the background while the PNGs are being made.
+    """
+    plaques = []
+    for file_name, fontSize, label_line1, label_line2 in jobs:
+        svg_text, artboard_width, artboard_height = create_svg_plaque(fontSize, label_line1, label_line2)
+        svg_file_path = os.path.join(output_folder, f"{file_name}_plaque.svg")
+        plaques.append((svg_file_path, svg_text, artboard_width, artboard_height))
+
+    # nothing reads the SVG files back, so a background thread writes them out while the PNGs are rendered.
+    # The rasterizers do their drawing in native code, so the two mostly run at the same time
+    with ThreadPoolExecutor(max_workers=1) as svg_writer:
+        svgs_written = svg_writer.submit(batch_write_svgs, [(svg_file_path, svg_text)
+                                                            for svg_file_path, svg_text, _, _ in plaques])
+
+        for svg_file_path, svg_text, artboard_width, artboard_height in plaques:
+            png_file_path = os.path.splitext(svg_file_path)[0] + ".png"
+            # svg_width_inches = plaque_width / 25.4
+            # svg_height_inches = plaque_height / 25.4
+            # output_width = int(svg_width_inches * 96)
+            # output_height = int(svg_height_inches * 96)
+            # print("output_width: ", output_width)
+            # print("Output_height: ", output_height, "\n")
+            # Convert SVG to PNG using CairoSVG
+            # cairosvg.svg2png(url=svg_file_path, write_to=png_file_path, dpi=96, output_width=(output_width * 2), output_height=(output_height*2))
+            _render_png_cached(svg_text, png_file_path, artboard_width, artboard_height, backend, cache_dir)
+
+        # re-raise anything that went wrong while saving the SVGs
+        svgs_written.result()
+
+
+def _render_png_cached(svg_text: str, png_file_path: str, artboard_width: float, artboard_height: float,
+                       backend: str, cache_dir: Optional[str]) -> None:
+    """
+    Makes the PNG of an SVG document, copying it from the cache if the same document has been rendered before.
+    The cache is only an optimization, so if it can't be read or written the PNG is simply rendered as normal.
+    """
+    if cache_dir is None:
+        _render_png(svg_text, png_file_path, artboard_width, artboard_height, backend)
+        return
+
+    # the key covers the whole SVG (which includes the size) rather than just the label, so changes to the plaque
+    # layout never pick up a stale PNG. The two rasterizers don't produce identical images, so it covers that too
+    used_backend = "resvg" if backend == "resvg" and resvg_py is not None else "cairosvg"
+    key = hashlib.blake2b(f"{used_backend}|{svg_text}".encode("utf-8"), digest_size=16).hexdigest()
+    cached_png_path = os.path.join(cache_dir, f"{key}.png")
+    try:
+        shutil.copyfile(cached_png_path, png_file_path)
+        # mark the PNG as recently used so it is the last to be pruned
+        os.utime(cached_png_path)
+        return
+    except OSError:  # not cached yet (or the cache can't be read), render it below. That overwrites any partial copy
+        pass
+
+    _render_png(svg_text, png_file_path, artboard_width, artboard_height, backend)
+
+    # copy under a temporary name first, so another worker process never copies a half-written PNG out of the cache
+    temp_png_path = f"{cached_png_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        shutil.copyfile(png_file_path, temp_png_path)
+        os.replace(temp_png_path, cached_png_path)
+        _prune_png_cache(cache_dir)
+    except OSError:  # the PNG itself has already been written, so just go without caching it
+        try:
+            os.remove(temp_png_path)
+        except OSError:
+            pass
+
+
+def _prune_png_cache(cache_dir: str) -> None:
+    """
+    Deletes the least recently used PNGs from the cache once it holds more than PNG_CACHE_MAX_FILES of them.
+    """
+    entries = [entry for entry in os.scandir(cache_dir) if entry.name.endswith(".png")]
+    if len(entries) <= PNG_CACHE_MAX_FILES:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in entries[:len(entries) - PNG_CACHE_MAX_FILES]:
+        try:
+            os.remove(entry.path)
+        except OSError:  # another worker process may have just deleted it
+            pass
+
+
+def _render_png(svg_text: str, png_file_path: str, artboard_width: float, artboard_height: float,
+                backend: str) -> None:
+    """
+    Rasterizes an SVG document to a PNG file of the given size, in pixels.
+    """
+    # a PNG is a whole number of pixels, so round the size once here rather than leaving it to the rasterizer
+    output_width = round(artboard_width)
+    output_height = round(artboard_height)
+    if backend == "resvg" and resvg_py is not None:
+        # resvg renders the same document around 10x faster than CairoSVG
+        png_bytes = resvg_py.svg_to_bytes(svg_string=svg_text, width=output_width, height=output_height)
+        # older versions of resvg_py return a list of ints rather than bytes
+        pathlib.Path(png_file_path).write_bytes(bytes(png_bytes))
+    else:
+        # the SVG is sized in user units and has a viewBox, so CairoSVG's default dpi doesn't need overriding.
+        # There's nothing to reuse between plaques here: a CairoSVG Tree is the parsed form of one document and a
+        # PNGSurface is created for one output at one size, and the import and font setup are already only paid
+        # once per process
+        cairosvg.svg2png(bytestring=svg_text.encode("utf-8"), write_to=png_file_path,
+                         output_width=output_width, output_height=output_height)
+
+
+# write_svg_plaques' worker processes import this module, so only generate the examples when run as a script
+if __name__ == "__main__":
+    test_output_folder = r"C:\Users\maxim\Documents\Treeline\outputFiles\plaques\png_conversion"
+
+    label1 = "Broken Mountain"
+    label1_underhang = "Goopy Pijen Rqual"
+    label2 = "Sisters, Kansas"
+
+    write_svg_plaques(test_output_folder, [
+        ("2_lines_noUnderhang", 80, label1, label2),
+        ("BrokenNoUnderhang", 80, label1, None),
+        ("underhang", 80, label1_underhang, None),
+        ("2_lines_underhang", 80, label1_underhang, label1_underhang),
+        ("0.8_offset", 24, label1, label1_underhang),
+        ("2_lines_underhang_topOnly", 80, label1_underhang, label1),
+    ])
\ No newline at end of file
@@ -0,0 +1,105 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch_writer
+
+
+class BatchWriteSvgsTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+
+    def documents(self, count):
+        # more documents than the ring has room for, so that they are submitted in several rounds
+        return [(os.path.join(self.folder.name, f"{i}.svg"), f'<svg><text>Café {i}</text></svg>')
+                for i in range(count)]
+
+    def assertWritten(self, documents):
+        for file_path, svg_content in documents:
+            with open(file_path, 'rb') as svg_file:
+                self.assertEqual(svg_file.read(), svg_content.encode('utf-8'))
+
+    def test_fallback_without_liburing(self):
+        documents = self.documents(3)
+        with mock.patch.object(batch_writer, "liburing", None):
+            batch_writer.batch_write_svgs(documents)
+        self.assertWritten(documents)
+
+
+@unittest.skipIf(batch_writer.liburing is None, "liburing is not installed")
+class IoUringBatchWriteSvgsTest(BatchWriteSvgsTest):
+    def test_writes_every_document(self):
+        documents = self.documents(batch_writer._RING_ENTRIES * 2 + 3)
+        batch_writer.batch_write_svgs(documents)
+        self.assertWritten(documents)
+
+    def test_overwrites_longer_file(self):
+        documents = self.documents(1)
+        with open(documents[0][0], 'wb') as svg_file:
+            svg_file.write(b"x" * 1000)
+        batch_writer.batch_write_svgs(documents)
+        self.assertWritten(documents)
+
+    def test_ring_is_set_up_once(self):
+        batch_writer.batch_write_svgs(self.documents(1))
+        ring = batch_writer._RING
+        batch_writer.batch_write_svgs(self.documents(2))
+        self.assertIs(batch_writer._RING, ring)
+
+    def test_finishes_short_writes(self):
+        prep_write = batch_writer.liburing.io_uring_prep_write
+
+        def prep_half_write(sqe, fd, buffer, offset):
+            prep_write(sqe, fd, buffer[:len(buffer) // 2], offset)
+
+        documents = self.documents(3)
+        with mock.patch.object(batch_writer.liburing, "io_uring_prep_write", prep_half_write):
+            batch_writer.batch_write_svgs(documents)
+        self.assertWritten(documents)
+
+    def test_failed_write_raises_and_leaves_ring_usable(self):
+        prep_write = batch_writer.liburing.io_uring_prep_write
+        bad_fd = os.open(os.devnull, os.O_RDONLY)
+        self.addCleanup(os.close, bad_fd)
+        calls = []
+
+        def prep_write_second_to_read_only_fd(sqe, fd, buffer, offset):
+            calls.append(fd)
+            prep_write(sqe, bad_fd if len(calls) == 2 else fd, buffer, offset)
+
+        documents = self.documents(3)
+        with mock.patch.object(batch_writer.liburing, "io_uring_prep_write", prep_write_second_to_read_only_fd):
+            with self.assertRaises(OSError) as raised:
+                batch_writer.batch_write_svgs(documents)
+        self.assertEqual(raised.exception.filename, documents[1][0])
+
+        # every completion of the failed batch was collected, so the next batch isn't confused by them
+        documents = self.documents(5)
+        batch_writer.batch_write_svgs(documents)
+        self.assertWritten(documents)
+
+    def test_new_files_get_the_same_mode_as_open(self):
+        # with no umask the mode passed when the file is created shows through unchanged
+        self.addCleanup(os.umask, os.umask(0))
+        reference = os.path.join(self.folder.name, "reference.svg")
+        with open(reference, 'wb'):
+            pass
+        documents = self.documents(1)
+        batch_writer.batch_write_svgs(documents)
+        self.assertEqual(os.stat(documents[0][0]).st_mode, os.stat(reference).st_mode)
+
+    def test_missing_folder_raises_and_leaves_ring_usable(self):
+        with self.assertRaises(FileNotFoundError):
+            batch_writer.batch_write_svgs([(os.path.join(self.folder.name, "missing", "a.svg"), "<svg/>")])
+        documents = self.documents(2)
+        batch_writer.batch_write_svgs(documents)
+        self.assertWritten(documents)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import atexit
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+# starting a worker process costs more than rendering a label, so one pool is shared by every call in a run
+# instead of starting a fresh one each time
+_POOL: Optional[ProcessPoolExecutor] = None
+# one worker per CPU, capped to the most that Windows can wait on at once
+_POOL_SIZE = min(os.cpu_count() or 1, 61) if sys.platform == "win32" else os.cpu_count() or 1
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    Returns the shared worker pool, starting it the first time it is needed. It is shut down when the program exits.
+
+    Returns:
+        ProcessPoolExecutor: A pool with one worker per CPU. Its jobs (such as the plaques in
+            plaqueGenerator.write_svg_plaques) are independent of each other, so they can use every core.
+    """
+    global _POOL
+    if _POOL is None:
+        # always spawn fresh workers rather than forking (the default on Linux). A forked worker would inherit
+        # whatever the parent has open, such as the pipe to the shared Inkscape shell, which then never sees EOF
+        # while the pool is alive
+        _POOL = ProcessPoolExecutor(max_workers=_POOL_SIZE, mp_context=multiprocessing.get_context("spawn"))
+        atexit.register(_POOL.shutdown)
+    return _POOL
+
+
+def pool_size() -> int:
+    """
+    Returns:
+        int: How many workers the pool from get_pool has, so that callers can split their work into that many parts.
+    """
+    return _POOL_SIZE